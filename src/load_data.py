@@ -9,6 +9,8 @@ This module handles loading cleaned data into PostgreSQL database:
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+from src.query_cache import bump_table_version, invalidate_table_version, cached_read_sql, cache_step
+
 # Database connection configuration
 #################### YOU SHOULD MODIFY USERNAME AND PASSWORD ####################
 DATABASE_CONFIG = {
@@ -39,9 +41,21 @@ def load_to_database(users_df):
         # Create SQLAlchemy engine
         engine = create_engine(connection_string)
 
+        # Forget the previous version while the table is being replaced
+        try:
+            invalidate_table_version(engine, 'users')
+        except Exception as e:
+            print(f"⚠️  Query cache not cleared: {e}")
+
         # Load users data
         users_df.to_sql('users', engine, if_exists='replace', index=False)
 
+        # Record the new version of the table for the query cache
+        try:
+            bump_table_version(engine, 'users', users_df)
+        except Exception as e:
+            print(f"⚠️  Query cache not updated: {e}")
+
         # Print loading statistics
         print(f"✅ Loaded {len(users_df)} users to database")
         
@@ -66,14 +80,15 @@ def verify_data():
         # Create SQLAlchemy engine
         engine = create_engine(connection_string)
 
-        # Count users in database
-        users_count = pd.read_sql("SELECT COUNT(*) as count FROM users", engine)
-        print(f"📊 Users in database: {users_count.iloc[0]['count']}")
+        with cache_step():
+            # Count users in database
+            users_count = cached_read_sql("SELECT COUNT(*) as count FROM users", engine, 'users')
+            print(f"📊 Users in database: {users_count.iloc[0]['count']}")
 
-        # Show sample user data
-        sample_users = pd.read_sql("SELECT * FROM users LIMIT 3", engine)
-        print("\n📋 Sample users:")
-        print(sample_users.to_string(index=False))
+            # Show sample user data
+            sample_users = cached_read_sql("SELECT * FROM users LIMIT 3", engine, 'users')
+            print("\n📋 Sample users:")
+            print(sample_users.to_string(index=False))
         
        
     except Exception as e:
@@ -90,39 +105,39 @@ def run_sample_queries():
     try:
         engine = create_engine(connection_string)
         
-        # Query 1: Users in Paris and proportion of total users
-        print("\n🌍 Number of users in Paris area and proportion of total users:")
-        query = """
-        SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
-        FROM users
-        WHERE latitude BETWEEN 48.815 AND 48.902
-          AND longitude BETWEEN 2.224 AND 2.469;
-        """
-        results = pd.read_sql(query, engine)
-        print(results.to_string(index=False))
-
-        # Query 2: Users in Marseille and proportion of total users
-        print("\n🌍 Number of users in Marseille area and proportion of total users:")
-        query = """
-        SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
-        FROM users
-        WHERE latitude BETWEEN 43.20 AND 43.40
-          AND longitude BETWEEN 5.30 AND 5.45;
-        """
-        results = pd.read_sql(query, engine)
-        print(results.to_string(index=False))
-
-        # Query 3: Users in Lyon and proportion of total users
-        print("\n🌍 Number of users in Lyon area and proportion of total users:")
-        query = """
-        SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
-        FROM users
-        WHERE latitude BETWEEN 45.70 AND 45.85
-          AND longitude BETWEEN 4.80 AND 5.00;
-        """
-        results = pd.read_sql(query, engine)
-        print(results.to_string(index=False))
-
+        with cache_step():
+            # Query 1: Users in Paris and proportion of total users
+            print("\n🌍 Number of users in Paris area and proportion of total users:")
+            query = """
+            SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
+            FROM users
+            WHERE latitude BETWEEN 48.815 AND 48.902
+              AND longitude BETWEEN 2.224 AND 2.469;
+            """
+            results = cached_read_sql(query, engine, 'users')
+            print(results.to_string(index=False))
+
+            # Query 2: Users in Marseille and proportion of total users
+            print("\n🌍 Number of users in Marseille area and proportion of total users:")
+            query = """
+            SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
+            FROM users
+            WHERE latitude BETWEEN 43.20 AND 43.40
+              AND longitude BETWEEN 5.30 AND 5.45;
+            """
+            results = cached_read_sql(query, engine, 'users')
+            print(results.to_string(index=False))
+
+            # Query 3: Users in Lyon and proportion of total users
+            print("\n🌍 Number of users in Lyon area and proportion of total users:")
+            query = """
+            SELECT COUNT(*) as user_count, (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM users)) as proportion
+            FROM users
+            WHERE latitude BETWEEN 45.70 AND 45.85
+              AND longitude BETWEEN 4.80 AND 5.00;
+            """
+            results = cached_read_sql(query, engine, 'users')
+            print(results.to_string(index=False))
     
     except Exception as e:
         print(f"❌ Error running sample queries: {e}")
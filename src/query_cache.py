@@ -0,0 +1,370 @@
+"""
+Query Cache Module
+
+This module caches the results of read-only queries on disk:
+- Keep a version (fingerprint) for each table of each database, bumped by the loader
+- Store query results keyed by database + SQL text + table versions
+- Optionally check the row count and max timestamp in the database, once per table per step
+- Evict least recently used results when the cache is full
+- Count cache hits and misses for each step
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Project root (parent of src/), so the cache is shared whatever the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cache configuration
+CACHE_CONFIG = {
+    'directory': os.path.join(PROJECT_ROOT, '.cache', 'queries'),  # where cached results are stored
+    'max_entries': 64,                                             # oldest (least recently used) results are removed above this
+    'check_database': False                                        # also compare row count and max timestamp with the database
+}
+
+VERSIONS_FILE = 'table_versions.json'
+
+# Hit/miss statistics since the start of the run
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# State of the current step (see cache_step): its own statistics and the tables already checked
+_STEP = {'stats': None, 'checked': None}
+
+
+def _database_url(engine):
+    """Identify the database an engine points at (password hidden)"""
+    return engine.url.render_as_string(hide_password=True)
+
+def _versions_path():
+    """Path of the JSON file holding the table versions"""
+    return os.path.join(CACHE_CONFIG['directory'], VERSIONS_FILE)
+
+def _read_versions():
+    """Read all table versions as {database url: {table: version}}, empty dict if none were recorded yet"""
+    try:
+        with open(_versions_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _atomic_write(path, data):
+    """Write bytes to a temporary file and move it into place, so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _write_versions(versions):
+    """Save all table versions"""
+    _atomic_write(_versions_path(), json.dumps(versions, indent=2).encode('utf-8'))
+
+def _live_fingerprint(engine, table_name, timestamp_column):
+    """
+    Read the row count and max timestamp of a table directly from the database
+
+    Returns:
+        str or None: Fingerprint such as "1000|2025-10-08 16:00:00+00:00", None if the query failed
+    """
+    query = f'SELECT COUNT(*) AS row_count, MAX("{timestamp_column}") AS max_timestamp FROM "{table_name}"'
+    try:
+        result = pd.read_sql(query, engine)
+    except Exception:
+        return None
+    return f"{result.iloc[0]['row_count']}|{result.iloc[0]['max_timestamp']}"
+
+def _content_hash(df):
+    """Short hash of the loaded data, so in-place edits also change the version"""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+
+def bump_table_version(engine, table_name, df, timestamp_column='timestamp'):
+    """
+    Record the version of a table after it has been loaded
+
+    Args:
+        engine: SQLAlchemy engine the table was loaded with
+        table_name (str): Name of the loaded table
+        df (pandas.DataFrame): Data written to the table
+        timestamp_column (str): Column used for the max timestamp
+    """
+    fingerprint = _live_fingerprint(engine, table_name, timestamp_column)
+    if fingerprint is None:
+        raise RuntimeError(f"could not read row count and max {timestamp_column} of {table_name}")
+
+    versions = _read_versions()
+    versions.setdefault(_database_url(engine), {})[table_name] = {
+        'fingerprint': fingerprint,
+        'content_hash': _content_hash(df),
+        'timestamp_column': timestamp_column
+    }
+    _write_versions(versions)
+
+def invalidate_table_version(engine, table_name):
+    """
+    Forget the version of a table so its cached results are no longer used
+
+    Args:
+        engine: SQLAlchemy engine pointing at the database of the table
+        table_name (str): Name of the table
+    """
+    versions = _read_versions()
+    if versions.get(_database_url(engine), {}).pop(table_name, None) is None:
+        return
+
+    _write_versions(versions)
+
+def get_table_version(engine, table_name):
+    """
+    Get the recorded version of a table
+
+    Args:
+        engine: SQLAlchemy engine pointing at the database of the table
+        table_name (str): Name of the table
+
+    Returns:
+        dict or None: Table version, None if the loader never recorded one
+    """
+    return _read_versions().get(_database_url(engine), {}).get(table_name)
+
+def _current_versions(engine, table_names):
+    """
+    Get the versions of the tables a query reads, as recorded by the loader
+
+    Returns:
+        list or None: One "table:fingerprint|hash" string per table, None if any table
+        has no recorded version (or, with check_database, changed since it was loaded)
+    """
+    current = []
+    for table_name in table_names:
+        version = get_table_version(engine, table_name)
+        if version is None:
+            return None
+
+        # By default the loader is trusted to be the only writer. With check_database, changes made
+        # outside it (database_setup.sql, another checkout...) are detected, checking each table once per step
+        if CACHE_CONFIG['check_database'] and not _is_unchanged(engine, table_name, version):
+            return None
+
+        current.append(f"{table_name}:{version['fingerprint']}|{version['content_hash']}")
+    return current
+
+def _is_unchanged(engine, table_name, version):
+    """Compare the row count and max timestamp in the database with the recorded version"""
+    checked = _STEP['checked']
+    key = (_database_url(engine), table_name, version['fingerprint'])
+    if checked is not None and key in checked:
+        return checked[key]
+
+    unchanged = _live_fingerprint(engine, table_name, version['timestamp_column']) == version['fingerprint']
+    if checked is not None:
+        checked[key] = unchanged
+    return unchanged
+
+def _count(kind):
+    """Count a hit or a miss for the run and for the current step"""
+    CACHE_STATS[kind] += 1
+    if _STEP['stats'] is not None:
+        _STEP['stats'][kind] += 1
+
+def _load_cached(path):
+    """
+    Load a cached result
+
+    Returns:
+        pandas.DataFrame or None: Cached result, None if there is none or it could not be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Corrupt file, pandas version change... drop it so it is not retried on every run
+        print(f"⚠️  Dropping unreadable cached result {os.path.basename(path)}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # Mark as recently used for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return result
+
+def _cache_path(engine, query, versions):
+    """Path of the cached result for a query on a database at given table versions"""
+    key_source = "\n".join([_database_url(engine)] + versions + [query])
+    key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_CONFIG['directory'], f"{key}.pkl")
+
+def _last_used(path):
+    """Last use time of a cached result, 0 if the file is already gone"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+def _evict_old_entries():
+    """Remove least recently used results until the cache fits max_entries"""
+    directory = CACHE_CONFIG['directory']
+    entries = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.pkl')]
+    if len(entries) <= CACHE_CONFIG['max_entries']:
+        return
+
+    entries.sort(key=_last_used)
+    for path in entries[:len(entries) - CACHE_CONFIG['max_entries']]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def cached_read_sql(query, engine, table_names):
+    """
+    Run a query with pandas.read_sql, reusing the cached result if the tables have not changed
+
+    Args:
+        query (str): SQL query to run
+        engine: SQLAlchemy engine
+        table_names (str or list): Table(s) the query reads from
+
+    Returns:
+        pandas.DataFrame: Query result
+    """
+    if isinstance(table_names, str):
+        table_names = [table_names]
+
+    versions = _current_versions(engine, table_names)
+    if versions is None:
+        # Unknown or changed version: never trust the cache
+        _count('misses')
+        return pd.read_sql(query, engine)
+
+    path = _cache_path(engine, query, versions)
+    result = _load_cached(path)
+    if result is not None:
+        _count('hits')
+        return result
+
+    _count('misses')
+    result = pd.read_sql(query, engine)
+
+    # Storing is best effort: the query already succeeded
+    try:
+        _atomic_write(path, pickle.dumps(result))
+        _evict_old_entries()
+    except OSError:
+        pass
+
+    return result
+
+def print_cache_stats(stats=None):
+    """
+    Print the cache hit/miss statistics
+
+    Args:
+        stats (dict): Statistics to print, defaults to the totals of the run
+    """
+    stats = stats or CACHE_STATS
+    total = stats['hits'] + stats['misses']
+    hit_rate = (stats['hits'] * 100.0 / total) if total else 0.0
+    print(f"🗄️  Query cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}% hit rate)")
+
+@contextmanager
+def cache_step():
+    """
+    Group the cached queries of a pipeline step
+
+    Database checks are done once per table for the whole step, and the hit/miss
+    statistics of the step are printed when it completes.
+    """
+    _STEP['stats'] = {'hits': 0, 'misses': 0}
+    _STEP['checked'] = {}
+    try:
+        yield
+        print_cache_stats(_STEP['stats'])
+    finally:
+        _STEP['stats'] = None
+        _STEP['checked'] = None
+
+if __name__ == "__main__":
+    """Test the query cache on a temporary SQLite database"""
+    from sqlalchemy import create_engine
+
+    print("Testing query cache functions...\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        CACHE_CONFIG['directory'] = os.path.join(tmp_dir, 'queries')
+        CACHE_CONFIG['max_entries'] = 2
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'test.db')}")
+
+        # Create some sample data for testing
+        sample_users = pd.DataFrame({
+            'user_id': [28, 29],
+            'timestamp': ['2025-10-08 18:00:00+02:00', '2025-10-08 18:05:00+02:00'],
+            'latitude': [48.8566, 45.7640],
+            'longitude': [2.3522, 4.8357]
+        })
+        sample_users.to_sql('users', engine, index=False)
+        query = "SELECT COUNT(*) as count FROM users"
+
+        # Without a recorded version, the cache is never used
+        with cache_step():
+            cached_read_sql(query, engine, 'users')
+            cached_read_sql(query, engine, 'users')
+        assert CACHE_STATS == {'hits': 0, 'misses': 2}
+
+        # After the loader bumps the version: one miss, then hits
+        bump_table_version(engine, 'users', sample_users)
+        with cache_step():
+            cached_read_sql(query, engine, 'users')
+            assert cached_read_sql(query, engine, 'users').iloc[0]['count'] == 2
+        assert CACHE_STATS == {'hits': 1, 'misses': 3}
+
+        # After invalidation, the cached result is no longer used
+        invalidate_table_version(engine, 'users')
+        assert get_table_version(engine, 'users') is None
+        cached_read_sql(query, engine, 'users')
+        assert CACHE_STATS == {'hits': 1, 'misses': 4}
+
+        # Above max_entries, the least recently used result is evicted
+        bump_table_version(engine, 'users', sample_users)
+        for other_query in ["SELECT 1 as x", "SELECT 2 as x", "SELECT 3 as x"]:
+            cached_read_sql(other_query, engine, 'users')
+        results = [name for name in os.listdir(CACHE_CONFIG['directory']) if name.endswith('.pkl')]
+        assert len(results) == 2
+        assert not os.path.exists(_cache_path(engine, query, _current_versions(engine, ['users'])))
+
+        # With check_database, a change made outside the loader is detected
+        CACHE_CONFIG['check_database'] = True
+        pd.DataFrame({'user_id': [30], 'timestamp': ['2025-10-08 18:10:00+02:00'],
+                      'latitude': [43.2965], 'longitude': [5.3698]}).to_sql('users', engine, index=False, if_exists='append')
+        assert cached_read_sql("SELECT 3 as x", engine, 'users').iloc[0]['x'] == 3
+        assert CACHE_STATS['hits'] == 1
+
+        # An unreadable cached result is dropped and counted as a miss
+        CACHE_CONFIG['check_database'] = False
+        path = _cache_path(engine, "SELECT 3 as x", _current_versions(engine, ['users']))
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+        cached_read_sql("SELECT 3 as x", engine, 'users')
+        assert CACHE_STATS['hits'] == 1
+        engine.dispose()
+
+    print("\nQuery cache testing complete!")